@@ -3,7 +3,8 @@ from dataclasses import dataclass
 from typing import Any, Optional
 from io import BytesIO
 import json
-import re
+
+import orjson
 
 # PDF (ReportLab)
 from reportlab.lib.pagesizes import letter
@@ -33,7 +34,7 @@ st.set_page_config(
 # ----------------------------
 # Lottie helpers
 # ----------------------------
-@st.cache_data(show_spinner=False)
+@st.cache_data(ttl=86400, show_spinner=False)
 def load_lottie_url(url: str):
     try:
         r = requests.get(url, timeout=10)
@@ -57,9 +58,7 @@ lottie_week = load_lottie_url(LOTTIE_WEEK)
 # ----------------------------
 # CSS (Pastel + Glassmorphism)
 # ----------------------------
-def inject_css():
-    st.markdown(
-        """
+_CSS_HTML = """
 <style>
 /* ---- Base colors ---- */
 :root{
@@ -182,17 +181,15 @@ ul, li { color: var(--ink) !important; }
   animation: fadeUp 380ms ease-out;
 }
 </style>
-        """,
-        unsafe_allow_html=True
-    )
+"""
 
-inject_css()
+st.markdown(_CSS_HTML, unsafe_allow_html=True)
 
 
 # ----------------------------
 # Data structures
 # ----------------------------
-@dataclass
+@dataclass(slots=True, frozen=True)
 class EvidenceItem:
     evidence_id: str
     platform: str
@@ -205,42 +202,76 @@ class EvidenceItem:
 # ----------------------------
 # Helpers: Safe text conversion (PREVENT JSON IN PDF)
 # ----------------------------
-def to_readable_text(x: Any) -> str:
-    if x is None:
-        return ""
+def _fmt_dict(x: dict) -> str:
+    lines = []
+    for k, v in x.items():
+        k2 = str(k).replace("_", " ").title()
+        if isinstance(v, (dict, list)):
+            lines.append(f"{k2}:\n{to_readable_text(v)}")
+        else:
+            lines.append(f"{k2}: {to_readable_text(v)}")
+    return "\n".join(lines).strip()
+
+
+def _fmt_list(x: list) -> str:
+    out = []
+    for item in x:
+        s = to_readable_text(item)
+        if not s:
+            continue
+        out.append(f"- {s}")
+    return "\n".join(out).strip()
+
+
+def _fmt_other(x: Any) -> str:
+    # Subclasses (OrderedDict, IntEnum, ...) miss the exact-type table but keep the readable format
     if isinstance(x, str):
         return x.strip()
     if isinstance(x, (int, float, bool)):
         return str(x)
-
     if isinstance(x, dict):
-        lines = []
-        for k, v in x.items():
-            k2 = str(k).replace("_", " ").title()
-            if isinstance(v, (dict, list)):
-                lines.append(f"{k2}:\n{to_readable_text(v)}")
-            else:
-                lines.append(f"{k2}: {to_readable_text(v)}")
-        return "\n".join(lines).strip()
-
+        return _fmt_dict(x)
     if isinstance(x, list):
-        out = []
-        for item in x:
-            s = to_readable_text(item)
-            if not s:
-                continue
-            out.append(f"- {s}")
-        return "\n".join(out).strip()
+        return _fmt_list(x)
 
     try:
-        return json.dumps(x, indent=2, ensure_ascii=False)
-    except Exception:
-        return str(x)
+        # Passthrough: dates/dataclasses aren't JSON to stdlib json either, so they keep the str() output
+        return orjson.dumps(
+            x,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+        ).decode()
+    except orjson.JSONEncodeError:
+        try:
+            return json.dumps(x, indent=2, ensure_ascii=False)
+        except Exception:
+            return str(x)
+
+
+# Exact-type dispatch: one dict lookup per node instead of an isinstance chain
+_DISPATCH = {
+    str: str.strip,
+    int: str,
+    float: str,
+    bool: str,
+    dict: _fmt_dict,
+    list: _fmt_list,
+}
+
+
+def to_readable_text(x: Any) -> str:
+    if x is None:
+        return ""
+    fn = _DISPATCH.get(type(x))
+    return fn(x) if fn else _fmt_other(x)
 
 
 # ----------------------------
 # PDF generation (ReportLab)
 # ----------------------------
+_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+
 def markdownish_to_flowables(md_text: str):
     styles = getSampleStyleSheet()
     base = ParagraphStyle(
@@ -264,7 +295,8 @@ def markdownish_to_flowables(md_text: str):
     def flush_bullets():
         nonlocal bullet_buf
         if bullet_buf:
-            items = [ListItem(Paragraph(re.sub(r"^[\\-\\*]\\s+", "", b), base)) for b in bullet_buf]
+            # bullets always start with "- " or "* " (see dispatch below)
+            items = [ListItem(Paragraph(b[2:].lstrip(), base)) for b in bullet_buf]
             flow.append(ListFlowable(items, bulletType="bullet", leftIndent=18))
             flow.append(Spacer(1, 6))
             bullet_buf = []
@@ -293,14 +325,16 @@ def markdownish_to_flowables(md_text: str):
             continue
 
         flush_bullets()
-        safe = line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        safe = line.translate(_ESCAPE_TABLE)
         flow.append(Paragraph(safe, base))
 
     flush_bullets()
     return flow
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
 def build_pdf_bytes(title: str, content: str) -> bytes:
+    # Cached: download buttons re-render on every rerun, ReportLab layout only runs for new content
     buffer = BytesIO()
     doc = SimpleDocTemplate(
         buffer,
@@ -321,26 +355,42 @@ def build_pdf_bytes(title: str, content: str) -> bytes:
 # ----------------------------
 # Retrieval
 # ----------------------------
-def run_retrieval(query: str, platform: str | None, country: str | None, top_k: int):
-    hits = search_feedback(
+@st.cache_data(ttl=600, show_spinner=False)
+def _cached_search(query: str, platform: str | None, country: str | None, top_k: int, ef_search: int) -> list[dict]:
+    # Plain dicts so Streamlit can pickle/cache them; identical reruns skip the embed + DB round-trip
+    return search_feedback(
         query=query,
         top_k=top_k,
-        country=(country.strip() or None) if country else None,
-        platform=(platform.strip() or None) if platform else None,
+        country=country,
+        platform=platform,
         user_type=None,  # ok if your wrapper ignores/doesn't use
+        ef_search=ef_search,
+    )
+
+
+def run_retrieval(query: str, platform: str | None, country: str | None, top_k: int, ef_search: int):
+    hits = _cached_search(
+        query.strip(),
+        (platform.strip() or None) if platform else None,
+        (country.strip() or None) if country else None,
+        top_k,
+        ef_search,
     )
 
-    results = []
+    # Build the dict form (for the agents) and the dataclass form (for rendering) together
+    items, dicts = [], []
     for h in hits:
-        results.append(EvidenceItem(
-            evidence_id=str(h.get("id")),
-            platform=h.get("platform") or "",
-            country=h.get("country") or "",
-            rating=h.get("rating"),
-            similarity=float(h.get("similarity") or 0.0),
-            text=(h.get("text") or "").strip(),
-        ))
-    return results
+        d = {
+            "evidence_id": str(h.get("id")),
+            "platform": h.get("platform") or "",
+            "country": h.get("country") or "",
+            "rating": h.get("rating"),
+            "similarity": float(h.get("similarity") or 0.0),
+            "text": (h.get("text") or "").strip(),
+        }
+        dicts.append(d)
+        items.append(EvidenceItem(**d))
+    return items, dicts
 
 
 # ----------------------------
@@ -377,14 +427,25 @@ with st.sidebar:
     country = st.text_input("Country filter (optional)", value="")
 
     top_k = st.slider("Top K matches", min_value=3, max_value=15, value=6)
+    ef_search = st.slider(
+        "Recall (ef_search)", min_value=10, max_value=200, value=40,
+        help="Higher searches more of the vector index: better recall, slower queries."
+    )
 
     # Animated cue next to button (tiny lottie optional)
     run_btn = st.button("Run Retrieval 🔎", use_container_width=True)
 
+    if st.button("Clear cache", use_container_width=True):
+        _cached_search.clear()
+
 
 # Session state
 if "evidence" not in st.session_state:
     st.session_state.evidence = []
+if "evidence_dicts" not in st.session_state:
+    st.session_state.evidence_dicts = []
+if "top_score" not in st.session_state:
+    st.session_state.top_score = 0.0
 if "analysis_text" not in st.session_state:
     st.session_state.analysis_text = ""
 if "weekly_text" not in st.session_state:
@@ -394,7 +455,10 @@ if "weekly_text" not in st.session_state:
 # Retrieval action (with spinner)
 if run_btn:
     with st.spinner("Retrieving evidence..."):
-        st.session_state.evidence = run_retrieval(query, platform or None, country.strip() or None, top_k)
+        st.session_state.evidence, st.session_state.evidence_dicts = run_retrieval(
+            query, platform or None, country.strip() or None, top_k, ef_search
+        )
+        st.session_state.top_score = max((e.similarity for e in st.session_state.evidence), default=0.0)
         # clear downstream outputs when new retrieval happens
         st.session_state.analysis_text = ""
         st.session_state.weekly_text = ""
@@ -403,7 +467,7 @@ if run_btn:
 # Metrics row
 col1, col2, col3 = st.columns(3)
 matches = len(st.session_state.evidence)
-top_score = max([e.similarity for e in st.session_state.evidence], default=0.0)
+top_score = st.session_state.top_score
 filter_label = f"{platform or 'All'} / {country.strip() or 'All'}"
 
 col1.metric("Matches", matches)
@@ -420,18 +484,17 @@ if mode == "Evidence":
     st.header("🔎 Retrieved Evidence")
 
     if matches > 0:
-        evidence_md = []
-        for e in st.session_state.evidence:
-            evidence_md.append(
-                f"## Evidence #{e.evidence_id}\n"
-                f"- Platform: {e.platform}\n"
-                f"- Country: {e.country}\n"
-                f"- Rating: {e.rating if e.rating is not None else 'N/A'}\n"
-                f"- Similarity: {e.similarity:.3f}\n\n"
-                f"{e.text}\n"
-            )
+        evidence_md = "\n".join(
+            f"## Evidence #{e.evidence_id}\n"
+            f"- Platform: {e.platform}\n"
+            f"- Country: {e.country}\n"
+            f"- Rating: {e.rating if e.rating is not None else 'N/A'}\n"
+            f"- Similarity: {e.similarity:.3f}\n\n"
+            f"{e.text}\n"
+            for e in st.session_state.evidence
+        )
 
-        pdf_bytes = build_pdf_bytes("Retrieved Evidence", "\n".join(evidence_md))
+        pdf_bytes = build_pdf_bytes("Retrieved Evidence", evidence_md)
         st.download_button(
             "Download Evidence (PDF) ⬇️",
             data=pdf_bytes,
@@ -440,18 +503,20 @@ if mode == "Evidence":
             use_container_width=True
         )
 
-    for e in st.session_state.evidence:
-        st.markdown(
-            f"""
+    # One markdown element for all cards instead of one per evidence item
+    cards_html = "".join(
+        f"""
 <div class="evidence-card fade-in">
   <div class="evidence-meta">
     <b>#{e.evidence_id}</b> &nbsp;•&nbsp; sim: {e.similarity:.3f} &nbsp;•&nbsp; {e.platform} {e.country} &nbsp;•&nbsp; rating: {e.rating if e.rating is not None else "N/A"}
   </div>
   <div class="evidence-text">{e.text}</div>
 </div>
-""",
-            unsafe_allow_html=True
-        )
+"""
+        for e in st.session_state.evidence
+    )
+    if cards_html:
+        st.markdown(cards_html, unsafe_allow_html=True)
 
 elif mode == "Agentic Analysis":
     # optional lottie decoration
@@ -469,7 +534,7 @@ elif mode == "Agentic Analysis":
             with st.spinner("Generating analysis..."):
                 analysis = run_agentic_analysis(
                     question=query,
-                    evidence=[e.__dict__ for e in st.session_state.evidence]
+                    evidence=st.session_state.evidence_dicts
                 )
                 st.session_state.analysis_text = to_readable_text(analysis)
 
@@ -500,7 +565,7 @@ elif mode == "Weekly PM Brief":
             with st.spinner("Generating brief..."):
                 brief = generate_weekly_pm_brief(
                     question=query,
-                    evidence=[e.__dict__ for e in st.session_state.evidence]
+                    evidence=st.session_state.evidence_dicts
                 )
                 st.session_state.weekly_text = to_readable_text(brief)
 
@@ -1,13 +1,20 @@
 import os
 import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from queue import Queue
 from dotenv import load_dotenv
 import psycopg
+from pgvector.psycopg import register_vector
 from openai import OpenAI
 
 # ---------- Config ----------
 TABLE_NAME = "public.feedback"
 CSV_PATH = os.path.join("data", "feedback_seed.csv")
+EMBED_BATCH_SIZE = 256  # embeddings endpoint accepts up to ~2048 inputs per call
+EMBED_WORKERS = 4       # concurrent embedding requests (HTTP-bound, release the GIL)
+PIPELINE_DEPTH = 2      # embedded batches allowed to wait for the COPY before the producer blocks
 
 def require_env(name: str) -> str:
     v = os.getenv(name)
@@ -15,6 +22,56 @@ def require_env(name: str) -> str:
         raise RuntimeError(f"Missing env var: {name}. Check your .env file.")
     return v
 
+def load_rows(path: str) -> list[dict]:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+
+        for r in reader:
+            text = (r.get("text") or "").strip()
+            if not text:
+                continue
+
+            source = (r.get("source") or "app_reviews").strip()
+            country = (r.get("country") or "").strip() or None
+            platform = (r.get("platform") or "").strip() or None
+            user_type = (r.get("user_type") or "").strip() or None
+
+            rating_raw = (r.get("rating") or "").strip()
+            rating = int(rating_raw) if rating_raw.isdigit() else None
+
+            created_at_raw = (r.get("created_at") or "").strip()
+            created_at = date.fromisoformat(created_at_raw) if created_at_raw else None
+
+            rows.append({
+                "source": source,
+                "country": country,
+                "platform": platform,
+                "rating": rating,
+                "user_type": user_type,
+                "created_at": created_at,
+                "text": text,
+            })
+    return rows
+
+def embed_batch(client: OpenAI, model: str, batch: list[dict]) -> list[list[float]]:
+    resp = client.embeddings.create(
+        model=model,
+        input=[r["text"] for r in batch]
+    )
+    return [d.embedding for d in resp.data]  # list[float] length 1536, same order as input
+
+def produce_batches(executor: ThreadPoolExecutor, client: OpenAI, model: str, batches: list[list[dict]], out: Queue):
+    # Submit embeddings in order; the bounded queue holds back new requests while the COPY catches up.
+    # Always ends with a marker: None when done, or the exception so the consumer re-raises it.
+    try:
+        for batch in batches:
+            out.put((batch, executor.submit(embed_batch, client, model, batch)))
+    except Exception as e:
+        out.put(e)
+    else:
+        out.put(None)
+
 def main():
     load_dotenv()
 
@@ -25,56 +82,63 @@ def main():
 
     client = OpenAI(api_key=api_key)
 
+    rows = load_rows(CSV_PATH)
+
     # Connect to Supabase Postgres
     with psycopg.connect(db_url) as conn:
         conn.autocommit = True
-
-        # Safety: If script is re-run, keep it idempotent by deleting rows for same seed source/date range
-        # For MVP, we’ll just wipe and reinsert everything.
-        with conn.cursor() as cur:
-            cur.execute(f"delete from {TABLE_NAME};")
+        register_vector(conn)  # binary COPY needs the pgvector dumper
 
         rows_inserted = 0
 
-        with open(CSV_PATH, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-
-            for r in reader:
-                text = (r.get("text") or "").strip()
-                if not text:
-                    continue
-
-                # 1) Create embedding
-                emb = client.embeddings.create(
-                    model=embed_model,
-                    input=text
-                ).data[0].embedding  # list[float] length 1536
-
-                # 2) Insert into DB
-                source = (r.get("source") or "app_reviews").strip()
-                country = (r.get("country") or "").strip() or None
-                platform = (r.get("platform") or "").strip() or None
-                user_type = (r.get("user_type") or "").strip() or None
-
-                rating_raw = (r.get("rating") or "").strip()
-                rating = int(rating_raw) if rating_raw.isdigit() else None
-
-                created_at_raw = (r.get("created_at") or "").strip()
-                created_at = created_at_raw if created_at_raw else None
-
-                with conn.cursor() as cur:
-                    cur.execute(
-                        f"""
-                        insert into {TABLE_NAME}
-                          (source, country, platform, rating, user_type, created_at, text, embedding)
-                        values
-                          (%s, %s, %s, %s, %s, %s, %s, %s::vector)
-                        """,
-                        (source, country, platform, rating, user_type, created_at, text, emb),
-                    )
-
-                rows_inserted += 1
-                print(f"Inserted {rows_inserted}: {country=} {platform=} {rating=} | {text[:60]}...")
+        batches = [rows[i:i + EMBED_BATCH_SIZE] for i in range(0, len(rows), EMBED_BATCH_SIZE)]
+
+        with conn.cursor() as cur, ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+            # Producer: embeds batches on the worker pool (starting while the table is being cleared).
+            # Consumer: this thread, streaming finished batches into the COPY in order.
+            ready: Queue = Queue(maxsize=PIPELINE_DEPTH)
+            producer = threading.Thread(
+                target=produce_batches,
+                args=(executor, client, embed_model, batches, ready),
+                daemon=True,
+            )
+            producer.start()
+
+            # Delete + reload in one transaction: if anything fails, the old rows stay in place
+            with conn.transaction():
+                # Safety: If script is re-run, keep it idempotent by deleting rows for same seed source/date range
+                # For MVP, we’ll just wipe and reinsert everything.
+                cur.execute(f"delete from {TABLE_NAME};")
+
+                # One binary COPY for the whole file: no per-row statement parsing
+                with cur.copy(
+                    f"""
+                    copy {TABLE_NAME}
+                      (source, country, platform, rating, user_type, created_at, text, embedding)
+                    from stdin with (format binary)
+                    """
+                ) as copy:
+                    copy.set_types(["text", "text", "text", "int4", "text", "date", "text", "vector"])
+
+                    while (item := ready.get()) is not None:
+                        if isinstance(item, Exception):
+                            raise item  # rolls back the delete and the COPY
+                        batch, embs_future = item
+
+                        # 1) Wait for this batch's embeddings (later batches keep embedding meanwhile)
+                        embs = embs_future.result()
+
+                        # 2) Stream the batch into the COPY
+                        for r, emb in zip(batch, embs):
+                            copy.write_row((
+                                r["source"], r["country"], r["platform"], r["rating"],
+                                r["user_type"], r["created_at"], r["text"], emb,
+                            ))
+
+                        rows_inserted += len(batch)
+                        print(f"Streamed {rows_inserted}/{len(rows)} rows...")
+
+            producer.join()
 
         print(f"\n Done. Inserted {rows_inserted} rows into {TABLE_NAME}.")
 
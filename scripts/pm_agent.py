@@ -4,18 +4,17 @@ def run_agentic_analysis(question: str, evidence: List[Dict]) -> str:
     # In your real version, call your LLM here.
     # IMPORTANT: Return a STRING (markdown), not JSON/dict.
 
-    evidence_lines = []
-    for e in evidence:
-        evidence_lines.append(
-            f"- Evidence #{e.get('evidence_id','?')} ({e.get('platform','?')} {e.get('country','?')}, sim {e.get('similarity',0):.3f}): {e.get('text','')}"
-        )
+    evidence_lines = "\n".join(
+        f"- Evidence #{e.get('evidence_id','?')} ({e.get('platform','?')} {e.get('country','?')}, sim {e.get('similarity',0):.3f}): {e.get('text','')}"
+        for e in evidence
+    )
 
     md = f"""
 ## Summary
 Payment failures on Android may be caused by a mix of **UI confusion** (users think payment failed, abandon, or mis-tap) and **platform-specific integration issues** (SDK, network, or auth differences).
 
 ## What the evidence suggests
-{chr(10).join(evidence_lines) if evidence_lines else "- No evidence retrieved."}
+{evidence_lines or "- No evidence retrieved."}
 
 ## Likely root-cause buckets
 - **UI/UX:** confusing CTA, unclear error states, payment method selection friction, redirect issues
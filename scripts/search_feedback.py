@@ -1,11 +1,17 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from openai import OpenAI
 
 load_dotenv()
 
+# Prepared statements don't survive transaction-mode poolers (Supabase port 6543); set to false there
+PREPARE_STATEMENTS = os.getenv("DB_PREPARE_STATEMENTS", "true").strip().lower() not in ("0", "false", "no")
+
 _client = None
+_pool = None
 
 def get_client() -> OpenAI:
     global _client
@@ -16,11 +22,31 @@ def get_client() -> OpenAI:
         _client = OpenAI(api_key=api_key)
     return _client
 
-def embed(text: str) -> list[float]:
-    model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        db_url = os.getenv("SUPABASE_DB_URL")
+        if not db_url:
+            raise RuntimeError("Missing SUPABASE_DB_URL in .env")
+        kwargs = {"autocommit": True}
+        if not PREPARE_STATEMENTS:
+            kwargs["prepare_threshold"] = None  # also stop psycopg auto-preparing repeated queries
+        # check: the idle connection may have been dropped by the server/pooler since last use
+        _pool = ConnectionPool(
+            db_url, min_size=1, max_size=4, kwargs=kwargs, check=ConnectionPool.check_connection, open=True
+        )
+    return _pool
+
+@lru_cache(maxsize=1024)
+def _embed_cached(model: str, text: str) -> tuple[float, ...]:
     client = get_client()
     r = client.embeddings.create(model=model, input=text)
-    return r.data[0].embedding
+    return tuple(r.data[0].embedding)
+
+def embed(text: str) -> list[float]:
+    model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+    # Same question asked again (reruns, other users) is served from the cache
+    return list(_embed_cached(model, text.strip()))
 
 def search_feedback(
     query: str,
@@ -28,19 +54,22 @@ def search_feedback(
     country: str | None = None,
     platform: str | None = None,
     user_type: str | None = None,
+    ef_search: int = 40,
 ) -> list[dict]:
-    db_url = os.getenv("SUPABASE_DB_URL")
-    if not db_url:
-        raise RuntimeError("Missing SUPABASE_DB_URL in .env")
+    pool = get_pool()
 
     query = (query or "").strip()
     if not query:
         return []
 
+    # Embed before borrowing a connection so a slow OpenAI call doesn't hold one of the pool's slots
     qvec = embed(query)
 
-    with psycopg.connect(db_url) as conn:
-        with conn.cursor() as cur:
+    with pool.connection() as conn:
+        # Transaction-local ef_search is picked up by match_feedback's index scan; clamped to top_k
+        # because HNSW can't return more rows than ef_search
+        with conn.transaction(), conn.cursor(row_factory=dict_row) as cur:
+            cur.execute("select set_config('hnsw.ef_search', %s, true)", (str(max(ef_search, top_k)),))
             cur.execute(
                 """
                 select * from match_feedback(
@@ -52,20 +81,14 @@ def search_feedback(
                 );
                 """,
                 (qvec, top_k, country, platform, user_type),
+                prepare=PREPARE_STATEMENTS,
             )
-            rows = cur.fetchall()
-
-    # IMPORTANT: adjust the unpacking order if your SQL returns different order
-    results = []
-    for (id_, content, country, platform, rating, similarity) in rows:
-        results.append({
-            "id": id_,
-            "text": content,
-            "country": country,
-            "platform": platform,
-            "rating": rating,
-            "similarity": float(similarity),
-        })
+            # Rows arrive as dicts keyed by match_feedback's column names; fix them up in place
+            results = []
+            for r in cur:
+                r["text"] = r.pop("content")
+                r["similarity"] = float(r["similarity"])
+                results.append(r)
     return results
 
 
@@ -1,27 +1,93 @@
 import os
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
-import psycopg
+import numpy as np
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from openai import OpenAI
 
 client = OpenAI()
 
-def embed_text(text: str, model: str) -> list[float]:
+# Default HNSW search breadth: higher = better recall, slower queries (pgvector default is 40)
+HNSW_EF_SEARCH = 40
+# Candidates fetched from pgvector before MMR picks a diverse top_k
+MMR_CANDIDATES = 50
+
+# Set DB_PREPARE_STATEMENTS=false when SUPABASE_DB_URL points at a transaction-mode pooler
+PREPARE_STATEMENTS = os.getenv("DB_PREPARE_STATEMENTS", "true").strip().lower() not in ("0", "false", "no")
+
+_pool: Optional[ConnectionPool] = None
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        db_url = os.getenv("SUPABASE_DB_URL")
+        if not db_url:
+            raise RuntimeError("Missing SUPABASE_DB_URL in .env")
+        kwargs = {"autocommit": True}
+        if not PREPARE_STATEMENTS:
+            kwargs["prepare_threshold"] = None
+        _pool = ConnectionPool(
+            db_url, min_size=1, max_size=4, kwargs=kwargs, check=ConnectionPool.check_connection, open=True
+        )
+    return _pool
+
+@lru_cache(maxsize=1024)
+def _embed_cached(model: str, text: str) -> tuple[float, ...]:
     resp = client.embeddings.create(model=model, input=text)
-    return resp.data[0].embedding
+    return tuple(resp.data[0].embedding)
+
+def embed_text(text: str, model: str) -> list[float]:
+    return list(_embed_cached(model, text.strip()))
+
+def mmr_rerank(q_emb: np.ndarray, embs: np.ndarray, k: int, lambda_: float = 0.5) -> List[int]:
+    # Maximal Marginal Relevance: pick k rows relevant to q_emb but not redundant with each other.
+    # lambda_=1.0 is pure relevance, 0.0 is pure diversity. Returns row indices in pick order.
+    n = embs.shape[0]
+    if n == 0 or k <= 0:
+        return []
+
+    # float32, C-contiguous, unit-normalised: every similarity below is one BLAS matmul.
+    # Copy before normalising in place so the caller's arrays are left untouched.
+    embs = np.ascontiguousarray(embs, dtype=np.float32).copy()
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True) + 1e-12
+    q = np.ascontiguousarray(q_emb, dtype=np.float32).copy()
+    q /= np.linalg.norm(q) + 1e-12
+
+    relevance = embs @ q          # (n,)
+    pairwise = embs @ embs.T      # (n, n)
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    max_sim = pairwise[first].copy()  # similarity of each row to its closest selected row
+
+    for _ in range(min(k, n) - 1):
+        scores = lambda_ * relevance - (1 - lambda_) * max_sim
+        scores[selected] = -np.inf
+        i = int(np.argmax(scores))
+        selected.append(i)
+        np.maximum(max_sim, pairwise[i], out=max_sim)
+
+    return selected
 
 def search_feedback(
     question: str,
     top_k: int = 6,
     platform: Optional[str] = None,
     country: Optional[str] = None,
+    mmr_lambda: Optional[float] = None,
+    ef_search: int = HNSW_EF_SEARCH,
 ) -> List[Dict[str, Any]]:
-    db_url = os.getenv("SUPABASE_DB_URL")
+    # mmr_lambda=None: plain cosine top_k. A value in [0, 1] (e.g. 0.5) turns on MMR diversification:
+    # search_feedback("Why is payment failing?", top_k=6, mmr_lambda=0.5)
     embed_model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
 
     q_emb = embed_text(question, embed_model)
 
+    # With MMR, over-fetch candidates (and their vectors) and diversify client-side
+    use_mmr = mmr_lambda is not None
     filters = []
-    params = {"q_emb": q_emb, "k": top_k}
+    params = {"q_emb": q_emb, "k": max(top_k, MMR_CANDIDATES) if use_mmr else top_k}
 
     if platform and platform.strip():
         filters.append("platform = %(platform)s")
@@ -32,7 +98,9 @@ def search_feedback(
         params["country"] = country.strip()
 
     where_clause = ("where " + " and ".join(filters)) if filters else ""
+    emb_column = ", embedding::real[] as emb" if use_mmr else ""
 
+    # Distance is computed once per row; the score is derived client-side
     sql = f"""
     select
       id,
@@ -40,27 +108,27 @@ def search_feedback(
       platform,
       rating,
       text,
-      1 - (embedding <=> %(q_emb)s) as score
+      embedding_half <=> %(q_emb)s::halfvec(1536) as dist{emb_column}
     from public.feedback
     {where_clause}
-    order by embedding <=> %(q_emb)s
+    order by dist
     limit %(k)s;
     """
 
-    with psycopg.connect(db_url) as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-
-    results = []
-    for (id_, country_, platform_, rating_, text_, score_) in rows:
-        results.append({
-            "id": id_,
-            "country": country_,
-            "platform": platform_,
-            "rating": rating_,
-            "text": text_,
-            "score": float(score_),
-        })
+    with get_pool().connection() as conn:
+        with conn.transaction():
+            with conn.cursor(row_factory=dict_row) as cur:
+                # ef_search >= row limit, otherwise MMR's over-fetch would be cut short
+                cur.execute("select set_config('hnsw.ef_search', %s, true)", (str(max(ef_search, params["k"])),))
+                cur.execute(sql, params, prepare=PREPARE_STATEMENTS)
+                results = []
+                for r in cur:
+                    r["score"] = 1 - float(r.pop("dist"))
+                    results.append(r)
+
+    if use_mmr and results:
+        embs = np.array([r.pop("emb") for r in results], dtype=np.float32)
+        order = mmr_rerank(np.asarray(q_emb, dtype=np.float32), embs, top_k, mmr_lambda)
+        results = [results[i] for i in order]
 
     return results